@@ -6,38 +6,45 @@ audacity_cue_converter.py: Bidirectional converter for .cue sheets and Audacity
 - Converts an Audacity label file back to a .cue file, copying metadata from the original .cue.
 
 Usage:
-  python audacity_cue_converter.py <filepath> [--shift N] [--force] [--region]
+  python audacity_cue_converter.py <filepath> [--shift N] [--force] [--region] [--no-ref]
 
 Examples:
   python audacity_cue_converter.py cd_image.cue
   python audacity_cue_converter.py labels.txt --force
+  python audacity_cue_converter.py labels.txt --no-ref
   python audacity_cue_converter.py sync_issue.cue --shift 500
 """
+import os
+import re
 import sys
 import argparse
 from pathlib import Path
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import List
 
+# large enough to flush a typical cue/label file in a single write
+WRITE_BUFFER_SIZE = 128 * 1024
+# double quotes would terminate a CUE TITLE string
+QUOTE_TRANS = str.maketrans('"', "'")
+# Audacity label line: start, end, title (tab-separated)
+LABEL_FMT = "%.6f\t%.6f\t%s\n"
+# 'mm:ss:ff'; minutes may exceed two digits on long images
+CUE_TS_RE = re.compile(r"(\d+):(\d+):(\d+)", re.ASCII)
+
 class ParseError(Exception):
     """Raised when CUE parsing fails."""
 
-@dataclass
 class Track:
     """Single audio track parsed from a CUE sheet."""
-    number: int
-    title: str
-    start_time: str
-    metadata: List[str] = field(default_factory=list)
-
-    @property
-    def seconds(self) -> float:
-        """Parses 'mm:ss:ff' to float seconds."""
-        try:
-            mm, ss, ff = map(int, self.start_time.split(':'))
-            return mm * 60 + ss + ff / 75.0
-        except (ValueError, AttributeError, IndexError):
-            raise ParseError(f"Malformed CUE timestamp: {self.start_time}")
+    # slotted: long sheets create thousands of these
+    __slots__ = ("number", "title", "start_time", "seconds", "metadata")
+
+    def __init__(self, number: int, title: str, start_time: str, seconds: float = 0.0):
+        self.number = number
+        self.title = title
+        self.start_time = start_time
+        self.seconds = seconds
+        self.metadata: List[str] = []
 
 @dataclass
 class CueSheet:
@@ -46,6 +53,14 @@ class CueSheet:
     tracks: List[Track]
     path: Path
 
+def cue_to_sec(timestamp: str) -> float:
+    """Parses 'mm:ss:ff' to float seconds."""
+    m = CUE_TS_RE.fullmatch(timestamp)
+    if not m:
+        raise ParseError(f"Malformed CUE timestamp: {timestamp}")
+    mm, ss, ff = m.groups()
+    return int(mm) * 60 + int(ss) + int(ff) / 75.0
+
 def sec_to_cue(seconds: float) -> str:
     """Converts seconds to 'mm:ss:ff' using integer math to prevent drift."""
     frames = round(max(0, seconds) * 75)
@@ -55,59 +70,80 @@ def sec_to_cue(seconds: float) -> str:
 
 def get_dest_path(base_path: Path, suffix: str, force: bool) -> Path:
     """Generates unique output path; appends numeric suffix if file exists."""
-    target = base_path.with_suffix(suffix)
-    if force or not target.exists():
-        return target
+    # probe plain strings; only the chosen name is wrapped in a Path
+    parent, stem = str(base_path.parent), base_path.stem
+    target = os.path.join(parent, f"{stem}{suffix}")
+    if force or not os.path.exists(target):
+        return Path(target)
     count = 1
     while True:
-        # compatible with python <3.9
-        new_target = base_path.with_name(f"{base_path.stem}-{count}{suffix}")
-        if not new_target.exists():
-            return new_target
+        new_target = os.path.join(parent, f"{stem}-{count}{suffix}")
+        if not os.path.exists(new_target):
+            return Path(new_target)
         count += 1
 
-def load_cue(path: Path) -> CueSheet:
-    """Parses a CUE file into a structured CueSheet object."""
-    content = ""
+def read_cue_text(path: Path) -> str:
+    """Reads and decodes a CUE file; the raw bytes are dropped on return."""
+    raw = path.read_bytes()
     # 'utf-8-sig' handles both BOM/noBOM variants automatically
     # fallback to the most common legacy encoding
     for enc in ["utf-8-sig", "cp1252"]:
         try:
-            content = path.read_text(encoding=enc)
-            break
+            return raw.decode(enc)
         except UnicodeDecodeError:
             continue
+    return ""
 
-    lines = [l.strip() for l in content.splitlines() if l.strip()]
-    if not lines:
-        raise ParseError(f"Error: File {path} is empty or unreadable.")
-
-    # single-file cue image validation
-    file_count = sum(1 for line in lines if line.lstrip().startswith("FILE "))
-    if file_count != 1:
-        raise ParseError(f"Unsupported cue format: expected 1 FILE line, found {file_count}.")
+def load_cue(path: Path, timestamps: bool = True) -> CueSheet:
+    """Parses a CUE file into a structured CueSheet object.
 
+    With timestamps=False, INDEX values are kept as text and not validated
+    (used for the reference sheet, whose timings are discarded anyway).
+    """
     header, tracks, current = [], [], None
+    file_count = 0
 
-    for line in lines:
-        if line.startswith("TRACK"):
-            parts = line.split()
-            num = int(parts[1]) if len(parts) > 1 else 0
-            current = Track(num, "Unknown", "00:00:00")
+    for line in read_cue_text(path).splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        # split off the keyword once (any whitespace); 'rest' is reused by every branch
+        parts = line.split(None, 1)
+        kw = parts[0]
+        rest = parts[1] if len(parts) > 1 else ""
+        # single-file cue image validation: count FILE lines that name a file
+        if kw == "FILE" and rest:
+            file_count += 1
+        if kw == "TRACK":
+            num = rest.split(None, 1)
+            current = Track(int(num[0]) if num else 0, "Unknown", "00:00:00")
             tracks.append(current)
         elif current:
-            if line.startswith("INDEX 01"): 
-                current.start_time = line.split()[-1]
-            elif line.startswith("TITLE"): 
-                current.title = line.split(' ', 1)[1].strip('"')
-                parts = line.split(' ', 1)
+            if kw == "INDEX":
+                idx = rest.split()
+                if idx and idx[0] == "01":
+                    # a truncated 'INDEX 01' is malformed, not a zero start
+                    current.start_time = idx[-1] if len(idx) > 1 else ""
+                    if timestamps:
+                        try:
+                            current.seconds = cue_to_sec(current.start_time)
+                        except ParseError:
+                            raise ParseError(f"Malformed CUE timestamp in {path.name}, track {current.number:02d}: '{line}'") from None
+            elif kw == "TITLE":
                 # safeguard against an empty title
-                current.title = parts[1].strip('"') if len(parts) > 1 else "Unknown"
-            # store the rest of tags
-            current.metadata.append(line)
+                current.title = rest.strip('"') if rest else "Unknown"
+            else:
+                # store the rest of tags; TITLE and INDEX are rebuilt on export
+                current.metadata.append(line)
         else:
             header.append(line)
-            
+
+    if not header and not tracks:
+        raise ParseError(f"Error: File {path} is empty or unreadable.")
+
+    if file_count != 1:
+        raise ParseError(f"Unsupported cue format: expected 1 FILE line, found {file_count}.")
+
     return CueSheet(header, tracks, path)
 
 def compare_titles(ref_tracks: List[Track], label_parts: List[List[str]]):
@@ -121,84 +157,74 @@ def compare_titles(ref_tracks: List[Track], label_parts: List[List[str]]):
             
 def convert(args):
     in_path = Path(args.filepath)
+    suffix = in_path.suffix.lower()
     shift = args.shift / 1000.0
 
     if not in_path.exists():
         raise FileNotFoundError(f"Input file not found: {in_path}")
 
     # 1. cue -> labels
-    if in_path.suffix.lower() == ".cue":
+    if suffix == ".cue":
         cue = load_cue(in_path)
         out_path = get_dest_path(in_path, ".txt", args.force)
-        with out_path.open("w", encoding="utf-8") as f:
-            for i, t in enumerate(cue.tracks):
-                ts_start = t.seconds + shift
-                
-                if args.region:
-                    # use the next track's start as the end
-                    if i + 1 < len(cue.tracks):
-                        ts_end = cue.tracks[i + 1].seconds + shift
-                    else:
-                        ts_end = ts_start
-                else:
-                    ts_end = ts_start
-                
-                f.write(f"{ts_start:.6f}\t{ts_end:.6f}\t{t.title}\n")
+        starts = [t.seconds + shift for t in cue.tracks]
+        # region labels end where the next track starts; the last one stays a point
+        ends = starts[1:] + starts[-1:] if args.region else starts
+        lines = [
+            LABEL_FMT % (ts_start, ts_end, t.title)
+            for ts_start, ts_end, t in zip(starts, ends, cue.tracks)
+            ]
+        with out_path.open("w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.writelines(lines)
         print(f"Saved: {out_path}")
 
     # 2. labels -> cue
-    elif in_path.suffix.lower() == ".txt":
+    elif suffix == ".txt":
         label_lines = [
-            l.split("\t")
-            for l in in_path.read_text(encoding="utf-8").splitlines()
-            if len(l.split('\t')) >= 3
+            parts
+            for parts in (l.split("\t") for l in in_path.read_text(encoding="utf-8").splitlines())
+            if len(parts) >= 3
             ]
         
         out_path = get_dest_path(in_path, ".cue", args.force)
         # load reference cue for metadata
         ref_path = in_path.with_suffix(".cue")
-        ref = load_cue(ref_path) if ref_path.exists() else None
+        # only header and tags are reused, so its timestamps are not validated
+        ref = load_cue(ref_path, timestamps=False) if not args.no_ref and ref_path.exists() else None
         
         if ref:
             compare_titles(ref.tracks, label_lines)
         
-        with out_path.open("w", encoding="utf-8") as f:
-            # global header
-            if ref and ref.header:
-                for line in ref.header:
-                    f.write(f"{line}\n")
-            else:
-                # minimal header if no reference cue found
-                f.write('PERFORMER "Unknown"\n')
-                f.write('TITLE "Converted from Labels"\n')
-                f.write(f'FILE "{in_path.with_suffix(".wav").name}" WAVE\n')
-
-            for i, parts in enumerate(label_lines, 1):
-                if len(parts) < 3:
-                    print(f"[WARN] Skipping malformed label line: {parts}", file=sys.stderr)
-                    continue
-                title = parts[2].strip()
-                # sanitize double quotes
-                if '"' in title:
-                    print(f"[WARN] Track {i:02d}: Double quotes in title sanitized to single quotes.", file=sys.stderr)
-                safe_title = title.strip().replace('"', "'")
-                
-                time_str = sec_to_cue(float(parts[0]) + shift)
-                
-                f.write(f"  TRACK {i:02d} AUDIO\n")
-                # restore tags from reference cue
-                match = next((t for t in ref.tracks if t.number == i), None) if ref else None
-                if match:
-                    for m_line in match.metadata:
-                        if m_line.startswith("TITLE"):
-                            f.write(f'    TITLE "{safe_title}"\n')
-                        elif not m_line.startswith("INDEX"):
-                            f.write(f"    {m_line}\n")
-                else:
-                    f.write(f'    TITLE "{safe_title}"\n')
-                    
-                f.write(f"    INDEX 01 {time_str}\n")
-                
+        ref_by_num = {t.number: t for t in ref.tracks} if ref else {}
+        out = []
+        # global header
+        if ref and ref.header:
+            out.extend(f"{line}\n" for line in ref.header)
+        else:
+            # minimal header if no reference cue found
+            out.append('PERFORMER "Unknown"\n')
+            out.append('TITLE "Converted from Labels"\n')
+            out.append(f'FILE "{in_path.with_suffix(".wav").name}" WAVE\n')
+
+        for i, parts in enumerate(label_lines, 1):
+            title = parts[2].strip()
+            # sanitize double quotes
+            safe_title = title.translate(QUOTE_TRANS)
+            if safe_title != title:
+                print(f"[WARN] Track {i:02d}: Double quotes in title sanitized to single quotes.", file=sys.stderr)
+            
+            time_str = sec_to_cue(float(parts[0]) + shift)
+            
+            out.append(f"  TRACK {i:02d} AUDIO\n")
+            out.append(f'    TITLE "{safe_title}"\n')
+            # restore tags from reference cue
+            match = ref_by_num.get(i)
+            if match:
+                out.extend(f"    {m_line}\n" for m_line in match.metadata)
+            out.append(f"    INDEX 01 {time_str}\n")
+
+        with out_path.open("w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write("".join(out))
         print(f"Saved: {out_path}")
 
 def main():
@@ -207,6 +233,7 @@ def main():
     parser.add_argument("--shift", type=float, default=0.0, help="Shift in milliseconds.")
     parser.add_argument("--force", action="store_true", help="Overwrite existing files.")
     parser.add_argument("--region", action="store_true", help="Export as region labels.")
+    parser.add_argument("--no-ref", action="store_true", help="Do not restore metadata from the original .cue.")
     args = parser.parse_args()
 
     try: